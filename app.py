@@ -1,152 +1,111 @@
+import functools
 import io
 import random
-from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import Dict, List, Tuple
 
 import streamlit as st
-import yaml
 
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+from generator.core import Bank, Question, bank_file_mtime, filter_bank, generate_exam, load_bank
+
 
 # -----------------------------
-# Model + càrrega YAML
+# Càrrega del banc (memòria cau de Streamlit)
 # -----------------------------
-@dataclass(frozen=True)
-class Question:
-    id: str
-    statement: str
-    topic: str
-    difficulty: str
-    answer: str
-
-
-def load_bank_yml(path: str) -> List[Question]:
-    p = Path(path)
-    if not p.exists():
-        raise ValueError(f"No trobo el fitxer del banc: {p}")
-
-    data = yaml.safe_load(p.read_text(encoding="utf-8"))
-    if not isinstance(data, list):
-        raise ValueError("bank.yml ha de ser una llista de preguntes.")
-
-    out: List[Question] = []
-    seen: Set[str] = set()
-
-    for i, item in enumerate(data, start=1):
-        if not isinstance(item, dict):
-            raise ValueError(f"Pregunta #{i} no és un objecte YAML.")
-
-        for k in ("id", "statement", "topic", "difficulty", "answer"):
-            if k not in item:
-                raise ValueError(f"Pregunta #{i} no té el camp '{k}'.")
-
-        qid = str(item["id"]).strip()
-        if not qid:
-            raise ValueError(f"Pregunta #{i} té id buit.")
-        if qid in seen:
-            raise ValueError(f"ID duplicat: {qid}")
-        seen.add(qid)
-
-        out.append(
-            Question(
-                id=qid,
-                statement=str(item["statement"]).strip(),
-                topic=str(item["topic"]).strip(),
-                difficulty=str(item["difficulty"]).strip().lower(),
-                answer=str(item["answer"]).strip(),
-            )
-        )
-
-    if not out:
-        raise ValueError("El banc està buit.")
-    return out
-
+# cache_resource i no cache_data: el Bank és immutable i així cada rerun el reutilitza
+# tal qual, sense tornar-lo a deserialitzar
+@st.cache_resource(show_spinner=False)
+def _load_bank_cached(path: str, mtime: int) -> Bank:
+    return load_bank(path, mtime)
 
-def filter_bank(bank: List[Question], topic: str, difficulty: str) -> List[Question]:
-    c = bank
-    if topic != "Tots":
-        c = [q for q in c if q.topic == topic]
-    if difficulty != "Totes":
-        c = [q for q in c if q.difficulty == difficulty.lower()]
-    return c
 
+def load_bank_yml(path: str, mtime: int) -> Bank:
+    """Carrega el banc memoritzat per (path, mtime) dins del procés de Streamlit.
 
-def pick_questions(candidates: List[Question], rng: random.Random, n: int, avoid_ids: Set[str]) -> List[Question]:
-    pool = [q for q in candidates if q.id not in avoid_ids]
-    if len(pool) < n:
-        raise ValueError(
-            "No hi ha prou preguntes al banc per crear l'examen.\n"
-            f"Disponibles (després de filtres i evitant repetits): {len(pool)}\n"
-            f"Necessàries: {n}\n"
-            f"Preguntes evitades: {len(avoid_ids)}"
-        )
-    return rng.sample(pool, n)
-
+    `mtime` s'ha de llegir un sol cop (amb `bank_file_mtime`) i reutilitzar per a totes
+    les memòries cau d'aquest rerun, perquè banc, PDF i descàrrega vegin el mateix fitxer.
+    """
+    return _load_bank_cached(path, mtime)
 
-def generate_exam(
-    candidates: List[Question],
-    seed: int,
-    n_exercises: int,
-    two_versions: bool,
-    allow_repeat_between_versions: bool,
-) -> Dict[str, List[Question]]:
-    if n_exercises <= 0:
-        raise ValueError("n_exercises ha de ser > 0")
-    if not candidates:
-        raise ValueError("Amb aquests filtres no hi ha cap pregunta disponible.")
-
-    rng = random.Random(seed)
-
-    if not two_versions:
-        return {"A": pick_questions(candidates, rng, n_exercises, avoid_ids=set())}
-
-    needed = n_exercises if allow_repeat_between_versions else 2 * n_exercises
-    if len(candidates) < needed:
-        raise ValueError(
-            "No hi ha prou preguntes per fer dues versions (A i B) amb aquesta configuració.\n"
-            f"Disponibles: {len(candidates)} | Necessàries: {needed}\n"
-            f"(n_exercises={n_exercises}, repetir entre A i B={'sí' if allow_repeat_between_versions else 'no'})"
-        )
 
-    used: Set[str] = set()
-    a = pick_questions(candidates, rng, n_exercises, avoid_ids=used)
-    used.update(q.id for q in a)
-
-    avoid_for_b = set() if allow_repeat_between_versions else used
-    b = pick_questions(candidates, rng, n_exercises, avoid_ids=avoid_for_b)
-
-    return {"A": a, "B": b}
+@st.cache_data(show_spinner=False)
+def _bank_bytes(path: str, mtime: int) -> bytes:
+    """Contingut del banc per al botó de descàrrega, sense rellegir el disc a cada rerun."""
+    return Path(path).read_bytes()
 
 
 # -----------------------------
 # PDF (ReportLab) - simple i robust
 # -----------------------------
+_HELVETICA = pdfmetrics.getFont("Helvetica")
+
+# geometria de pàgina: constant, es calcula un sol cop
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN_X = 2.0 * cm
+MARGIN_Y = 2.0 * cm
+MAX_TEXT_WIDTH = PAGE_WIDTH - 2 * MARGIN_X
+LEADING = 14
+
+
+@functools.lru_cache(maxsize=65536)
+def _word_width(word: str) -> float:
+    """Amplada de `word` en Helvetica 11, memoritzada (les paraules es repeteixen molt)."""
+    return _HELVETICA.stringWidth(word, 11)
+
+
+def _split_long_word(word: str, max_width: float) -> List[str]:
+    """Parteix una paraula més ampla que max_width en trossos que hi caben."""
+    avg_char_width = _word_width(word) / len(word) or 1.0
+    pieces: List[str] = []
+    while word:
+        # estimació per amplada mitjana de caràcter i correcció a la frontera
+        k = max(1, min(len(word), int(max_width // avg_char_width)))
+        while k > 1 and _word_width(word[:k]) > max_width:
+            k -= 1
+        while k < len(word) and _word_width(word[: k + 1]) <= max_width:
+            k += 1
+        pieces.append(word[:k])
+        word = word[k:]
+    return pieces
+
+
 def wrap_text(c: canvas.Canvas, text: str, x: float, y: float, max_width: float, leading: float) -> float:
     """Dibuixa text amb salt de línia automàtic. Retorna la nova y."""
+    space_width = _word_width(" ")
     for paragraph in text.split("\n"):
         paragraph = paragraph.rstrip()
         if not paragraph:
             y -= leading
             continue
 
-        words = paragraph.split()
-        line = ""
-        for w in words:
-            test = (line + " " + w).strip()
-            if c.stringWidth(test, "Helvetica", 11) <= max_width:
-                line = test
-            else:
-                c.drawString(x, y, line)
+        line_words: List[str] = []
+        line_width = 0.0
+        for w in paragraph.split():
+            w_width = _word_width(w)
+            if line_words and line_width + space_width + w_width <= max_width:
+                line_words.append(w)
+                line_width += space_width + w_width
+                continue
+
+            # només es construeix la cadena de la línia quan es dibuixa
+            if line_words:
+                c.drawString(x, y, " ".join(line_words))
                 y -= leading
-                line = w
-        if line:
-            c.drawString(x, y, line)
+            if w_width > max_width:
+                *pieces, w = _split_long_word(w, max_width)
+                for piece in pieces:
+                    c.drawString(x, y, piece)
+                    y -= leading
+                w_width = _word_width(w)
+            line_words = [w]
+            line_width = w_width
+        if line_words:
+            c.drawString(x, y, " ".join(line_words))
             y -= leading
     return y
 
@@ -160,50 +119,47 @@ def make_exam_pdf(
 ) -> bytes:
     buf = io.BytesIO()
     c = canvas.Canvas(buf, pagesize=A4)
-    width, height = A4
-
-    margin_x = 2.0 * cm
-    margin_y = 2.0 * cm
-    max_width = width - 2 * margin_x
-    leading = 14
+    seed_label = f"seed: {seed}"
+    instructions = f"Instruccions: respon a TOTES les qüestions. Cada exercici val {points_per_ex:g} punts."
 
     def header(page_title: str):
         c.setFont("Helvetica-Bold", 14)
-        c.drawString(margin_x, height - margin_y, page_title)
+        c.drawString(MARGIN_X, PAGE_HEIGHT - MARGIN_Y, page_title)
         c.setFont("Helvetica", 10)
-        c.drawRightString(width - margin_x, height - margin_y, f"seed: {seed}")
+        c.drawRightString(PAGE_WIDTH - MARGIN_X, PAGE_HEIGHT - MARGIN_Y, seed_label)
         c.setLineWidth(0.5)
-        c.line(margin_x, height - margin_y - 8, width - margin_x, height - margin_y - 8)
+        c.line(MARGIN_X, PAGE_HEIGHT - MARGIN_Y - 8, PAGE_WIDTH - MARGIN_X, PAGE_HEIGHT - MARGIN_Y - 8)
 
     for version_name, questions in exam.items():
-        header(f"{title} — Versió {version_name}")
-        y = height - margin_y - 30
+        page_title = f"{title} — Versió {version_name}"
+        header(page_title)
+        y = PAGE_HEIGHT - MARGIN_Y - 30
 
         c.setFont("Helvetica", 11)
-        c.drawString(margin_x, y, f"Instruccions: respon a TOTES les qüestions. Cada exercici val {points_per_ex:g} punts.")
+        c.drawString(MARGIN_X, y, instructions)
         y -= 22
 
         for i, q in enumerate(questions, start=1):
             block_title = f"{i}. [{q.topic} | {q.difficulty}]"
             c.setFont("Helvetica-Bold", 11)
-            c.drawString(margin_x, y, block_title)
-            y -= leading
+            c.drawString(MARGIN_X, y, block_title)
+            y -= LEADING
 
             c.setFont("Helvetica", 11)
-            y = wrap_text(c, q.statement, margin_x, y, max_width, leading)
+            y = wrap_text(c, q.statement, MARGIN_X, y, MAX_TEXT_WIDTH, LEADING)
 
             if include_solutions:
                 y -= 4
                 c.setFont("Helvetica-Oblique", 10)
-                y = wrap_text(c, "Resposta orientativa: " + q.answer, margin_x, y, max_width, 12)
+                y = wrap_text(c, "Resposta orientativa: " + q.answer, MARGIN_X, y, MAX_TEXT_WIDTH, 12)
 
             y -= 10
 
             # salt de pàgina si cal
-            if y < margin_y + 60:
+            if y < MARGIN_Y + 60:
                 c.showPage()
-                header(f"{title} — Versió {version_name}")
-                y = height - margin_y - 30
+                header(page_title)
+                y = PAGE_HEIGHT - MARGIN_Y - 30
 
         c.showPage()
 
@@ -211,6 +167,31 @@ def make_exam_pdf(
     return buf.getvalue()
 
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def make_exam_pdf_cached(
+    bank_path: str,
+    bank_mtime: int,
+    title: str,
+    seed: int,
+    include_solutions: bool,
+    points_per_ex: float,
+    question_ids_A: Tuple[str, ...],
+    question_ids_B: Tuple[str, ...],
+) -> bytes:
+    """Com `make_exam_pdf`, però memoritzat per ids de pregunta (B buit = una sola versió)."""
+    bank = _load_bank_cached(bank_path, bank_mtime)
+    exam = {"A": [bank.by_id[i] for i in question_ids_A]}
+    if question_ids_B:
+        exam["B"] = [bank.by_id[i] for i in question_ids_B]
+    return make_exam_pdf(
+        exam=exam,
+        title=title,
+        seed=seed,
+        include_solutions=include_solutions,
+        points_per_ex=points_per_ex,
+    )
+
+
 # -----------------------------
 # Streamlit UI
 # -----------------------------
@@ -225,13 +206,14 @@ st.caption(
 BANK_PATH = "bank.yml"
 
 try:
-    bank = load_bank_yml(BANK_PATH)
+    bank_mtime = bank_file_mtime(BANK_PATH)
+    bank = load_bank_yml(BANK_PATH, bank_mtime)
 except ValueError as e:
     st.error(f"Error carregant bank.yml: {e}")
     st.stop()
 
-topics = sorted({q.topic for q in bank})
-difficulties = sorted({q.difficulty for q in bank})
+topics = sorted(bank.by_topic)
+difficulties = sorted(bank.by_difficulty)
 
 with st.sidebar:
     st.header("Configuració examen")
@@ -258,7 +240,7 @@ with col1:
 with col2:
     st.download_button(
         "⬇️ Descarregar bank.yml",
-        data=Path(BANK_PATH).read_bytes(),
+        data=_bank_bytes(BANK_PATH, bank_mtime),
         file_name="bank.yml",
         mime="text/yaml",
         use_container_width=True,
@@ -277,24 +259,33 @@ if do_generate:
             allow_repeat_between_versions=bool(allow_repeat),
         )
     except ValueError as e:
+        st.session_state.pop("last_pdf", None)
         st.error(str(e))
         st.info("Solucions: baixa exercicis, treu filtres, afegeix més preguntes al bank.yml, o permet repetició entre A i B.")
         st.stop()
 
-    st.success(f"Examen generat ✅ (seed = {chosen_seed})")
-
-    pdf_bytes = make_exam_pdf(
-        exam=exam,
+    pdf_bytes = make_exam_pdf_cached(
+        bank_path=BANK_PATH,
+        bank_mtime=bank_mtime,
         title=title,
         seed=chosen_seed,
-        include_solutions=include_solutions,
+        include_solutions=bool(include_solutions),
         points_per_ex=float(points_per_ex),
+        question_ids_A=tuple(q.id for q in exam["A"]),
+        question_ids_B=tuple(q.id for q in exam.get("B", ())),
     )
+    # es conserva entre reruns: clicar "Descarregar PDF" no torna a generar res
+    st.session_state["last_pdf"] = (chosen_seed, pdf_bytes, exam, bool(include_solutions))
+
+if "last_pdf" in st.session_state:
+    last_seed, pdf_bytes, exam, with_solutions = st.session_state["last_pdf"]
+
+    st.success(f"Examen generat ✅ (seed = {last_seed})")
 
     st.download_button(
         "🧾 Descarregar PDF",
         data=pdf_bytes,
-        file_name=f"examen_{chosen_seed}.pdf",
+        file_name=f"examen_{last_seed}.pdf",
         mime="application/pdf",
         use_container_width=True,
     )
@@ -305,5 +296,5 @@ if do_generate:
         for i, q in enumerate(exam[v], start=1):
             with st.expander(f"{i}. {q.topic} | {q.difficulty} | {q.id}", expanded=(i <= 1)):
                 st.markdown(q.statement)
-                if include_solutions:
+                if with_solutions:
                     st.markdown(f"**Resposta:** {q.answer}")
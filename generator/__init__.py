@@ -0,0 +1 @@
+"""Lògica compartida del generador: model, càrrega del banc i selecció de preguntes."""
@@ -0,0 +1,187 @@
+import pickle
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:  # PyYAML sense libyaml
+    from yaml import SafeLoader as _YamlLoader
+
+
+# -----------------------------
+# Model + càrrega YAML
+# -----------------------------
+@dataclass(frozen=True)
+class Question:
+    id: str
+    statement: str
+    topic: str
+    difficulty: str
+    answer: str
+
+
+@dataclass(frozen=True)
+class Bank:
+    """Banc de preguntes amb els índexs per tema/dificultat precalculats."""
+
+    all: Tuple[Question, ...]
+    by_topic: Dict[str, Tuple[Question, ...]]
+    by_difficulty: Dict[str, Tuple[Question, ...]]
+    by_pair: Dict[Tuple[str, str], Tuple[Question, ...]]
+    by_id: Dict[str, Question]
+
+
+def build_bank(questions: Sequence[Question]) -> Bank:
+    by_topic: Dict[str, List[Question]] = {}
+    by_difficulty: Dict[str, List[Question]] = {}
+    by_pair: Dict[Tuple[str, str], List[Question]] = {}
+    for q in questions:
+        by_topic.setdefault(q.topic, []).append(q)
+        by_difficulty.setdefault(q.difficulty, []).append(q)
+        by_pair.setdefault((q.topic, q.difficulty), []).append(q)
+
+    return Bank(
+        all=tuple(questions),
+        by_topic={k: tuple(v) for k, v in by_topic.items()},
+        by_difficulty={k: tuple(v) for k, v in by_difficulty.items()},
+        by_pair={k: tuple(v) for k, v in by_pair.items()},
+        by_id={q.id: q for q in questions},
+    )
+
+
+def _parse_bank_yml(p: Path) -> List[Question]:
+    data = yaml.load(p.read_bytes(), Loader=_YamlLoader)
+    if not isinstance(data, list):
+        raise ValueError("bank.yml ha de ser una llista de preguntes.")
+
+    out: List[Question] = []
+    seen: Set[str] = set()
+
+    for i, item in enumerate(data, start=1):
+        if not isinstance(item, dict):
+            raise ValueError(f"Pregunta #{i} no és un objecte YAML.")
+
+        for k in ("id", "statement", "topic", "difficulty", "answer"):
+            if k not in item:
+                raise ValueError(f"Pregunta #{i} no té el camp '{k}'.")
+
+        qid = str(item["id"]).strip()
+        if not qid:
+            raise ValueError(f"Pregunta #{i} té id buit.")
+        if qid in seen:
+            raise ValueError(f"ID duplicat: {qid}")
+        seen.add(qid)
+
+        out.append(
+            Question(
+                id=qid,
+                statement=str(item["statement"]).strip(),
+                topic=str(item["topic"]).strip(),
+                difficulty=str(item["difficulty"]).strip().lower(),
+                answer=str(item["answer"]).strip(),
+            )
+        )
+
+    if not out:
+        raise ValueError("El banc està buit.")
+    return out
+
+
+# s'incrementa quan canvia el que es desa al sidecar .pkl
+_BANK_CACHE_VERSION = 3
+
+
+def bank_file_mtime(path: str) -> int:
+    """mtime (ns) del fitxer del banc; és la clau de totes les memòries cau del banc."""
+    p = Path(path)
+    if not p.exists():
+        raise ValueError(f"No trobo el fitxer del banc: {p}")
+    return p.stat().st_mtime_ns
+
+
+def load_bank(path: str, mtime: Optional[int] = None) -> Bank:
+    """Carrega el banc, reutilitzant el sidecar `<banc>.pkl` si correspon a l'mtime actual."""
+    if mtime is None:
+        mtime = bank_file_mtime(path)
+    p = Path(path)
+    cache_path = p.with_name(p.name + ".pkl")
+
+    try:
+        with cache_path.open("rb") as f:
+            version, cached_mtime, cached = pickle.load(f)
+        if version == _BANK_CACHE_VERSION and cached_mtime == mtime:
+            return cached
+    except Exception:
+        # sense sidecar, corrupte o d'una versió antiga: es regenera
+        pass
+
+    out = build_bank(_parse_bank_yml(p))
+    try:
+        with cache_path.open("wb") as f:
+            pickle.dump((_BANK_CACHE_VERSION, mtime, out), f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        # directori de només lectura: seguim sense sidecar
+        pass
+    return out
+
+
+def filter_bank(bank: Bank, topic: str, difficulty: str) -> Sequence[Question]:
+    if topic == "Tots" and difficulty == "Totes":
+        return bank.all
+    if topic == "Tots":
+        return bank.by_difficulty.get(difficulty.lower(), ())
+    if difficulty == "Totes":
+        return bank.by_topic.get(topic, ())
+    return bank.by_pair.get((topic, difficulty.lower()), ())
+
+
+def pick_questions(candidates: Sequence[Question], rng: random.Random, n: int, avoid_ids: Set[str]) -> List[Question]:
+    # sense preguntes a evitar es mostreja directament sobre l'índex, sense còpia
+    pool = [q for q in candidates if q.id not in avoid_ids] if avoid_ids else candidates
+    if len(pool) < n:
+        raise ValueError(
+            "No hi ha prou preguntes al banc per crear l'examen.\n"
+            f"Disponibles (després de filtres i evitant repetits): {len(pool)}\n"
+            f"Necessàries: {n}\n"
+            f"Preguntes evitades: {len(avoid_ids)}"
+        )
+    return rng.sample(pool, n)
+
+
+def generate_exam(
+    candidates: Sequence[Question],
+    seed: int,
+    n_exercises: int,
+    two_versions: bool,
+    allow_repeat_between_versions: bool,
+) -> Dict[str, List[Question]]:
+    if n_exercises <= 0:
+        raise ValueError("n_exercises ha de ser > 0")
+    if not candidates:
+        raise ValueError("Amb aquests filtres no hi ha cap pregunta disponible.")
+
+    rng = random.Random(seed)
+
+    if not two_versions:
+        return {"A": pick_questions(candidates, rng, n_exercises, avoid_ids=set())}
+
+    needed = n_exercises if allow_repeat_between_versions else 2 * n_exercises
+    if len(candidates) < needed:
+        raise ValueError(
+            "No hi ha prou preguntes per fer dues versions (A i B) amb aquesta configuració.\n"
+            f"Disponibles: {len(candidates)} | Necessàries: {needed}\n"
+            f"(n_exercises={n_exercises}, repetir entre A i B={'sí' if allow_repeat_between_versions else 'no'})"
+        )
+
+    if allow_repeat_between_versions:
+        a = pick_questions(candidates, rng, n_exercises, avoid_ids=set())
+        b = pick_questions(candidates, rng, n_exercises, avoid_ids=set())
+        return {"A": a, "B": b}
+
+    # una sola extracció de 2n preguntes ja garanteix que A i B no comparteixen cap
+    picked = rng.sample(candidates, needed)
+    return {"A": picked[:n_exercises], "B": picked[n_exercises:]}